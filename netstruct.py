@@ -30,6 +30,18 @@ from __future__ import unicode_literals
 
 from struct import Struct as _Struct, error, calcsize as _calcsize
 
+import sys
+import zlib
+
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 try:
     # Stupid Python 3...
@@ -42,7 +54,7 @@ except NameError:
 ###############################################################################
 
 __all__ = (
-    "NetStruct",
+    "NetStruct", "BufferPool", "Decoder", "Encoder",
 
     "pack", "unpack", "obj_unpack", "iter_unpack",
     "minimum_size", "initial_size"
@@ -53,6 +65,8 @@ __version__ = ".".join(map(str, __version_info__))
 
 bytes = type(b"")
 
+_ZlibCompress = type(zlib.compressobj())
+
 
 ###############################################################################
 # Unpacker Class
@@ -80,15 +94,37 @@ class Unpacker(object):
         [825373492, b'12345', 0, 1, 2, 3, 4]
         >>> obj.unused_data
         b' so there'
+
+    Only the bytes belonging to the message are kept in the Unpacker's buffer,
+    and the size limits of the NetStruct are checked as soon as each string
+    length is known, so :attr:`remaining` is always a safe amount to read next.
+
+    If a :class:`BufferPool` is given as *pool*, the buffer is borrowed from
+    the pool on the first call to :meth:`feed` and returned once unpacking
+    has completed, failed, or :meth:`close` is called.
+
+    Once :meth:`feed` has raised a :class:`struct.error`, the Unpacker is
+    finished and every later call to :meth:`feed` raises as well.
     """
 
-    __slots__ = ("_pairs", "_data", "_result", "_remaining")
+    __slots__ = ("_pairs", "_maxsize", "_pool", "_buffer", "_start", "_end",
+                 "_size", "_result", "_unused", "_failed")
+
+    def __init__(self, netstruct, data=b"", pool=None):
+        if pool is not None and netstruct._minsize > pool.capacity:
+            raise error("unpack requires a buffer of at least %d bytes" %
+                        netstruct._minsize)
 
-    def __init__(self, netstruct, data=b""):
         self._pairs = netstruct._pairs[:]
-        self._remaining = netstruct._minsize
-        self._data = b""
+        self._maxsize = netstruct._maxsize
+        self._pool = pool
+        self._buffer = None
+        self._start = 0
+        self._end = 0
+        self._size = netstruct._minsize
         self._result = []
+        self._unused = b""
+        self._failed = False
 
         if data:
             self.feed(data)
@@ -110,12 +146,12 @@ class Unpacker(object):
         """
         The number of remaining bytes needed to finish unpacking the data.
         """
-        return max(0, self._remaining - len(self._data))
+        return self._size - self._end
 
     @property
     def result(self):
         """ The resulting object, after all unpacking has completed. """
-        return None if self._remaining else self._result
+        return None if self._pairs or self._failed else self._result
 
     @property
     def unused_data(self):
@@ -123,49 +159,385 @@ class Unpacker(object):
         A string which contains any bytes that weren't used in the construction
         of the object.
         """
-        return b"" if self._remaining else self._data
+        return b"" if self._pairs or self._failed else self._unused
 
     ##### Methods #############################################################
 
     def feed(self, data):
         """
         Unpack *data* and return the number of remaining bytes needed to
-        finish unpacking the NetStruct.
+        finish unpacking the NetStruct. Raises a :class:`struct.error` if a
+        string length exceeds the limits of the NetStruct or the capacity of
+        the buffer pool.
         """
-        self._data += data
+        if self._failed:
+            raise error("unpacker has already failed")
+        elif not self._pairs:
+            self._unused += data
+            return 0
+
+        view = memoryview(data)
+        offset = 0
+
+        if self._buffer is None and len(view):
+            if self._pool is not None:
+                self._buffer = self._pool.acquire()
+            else:
+                self._buffer = bytearray()
+
+        try:
+            while True:
+                needed = min(self._size - self._end, len(view) - offset)
+                if needed:
+                    end = self._end + needed
+                    self._buffer[self._end:end] = view[offset:offset + needed]
+                    self._end = end
+                    offset += needed
+
+                self._parse()
+
+                if not self._pairs:
+                    self._unused = view[offset:].tobytes()
+                    self.close()
+                    return 0
+
+                if offset == len(view):
+                    return self._size - self._end
+        except error:
+            self._failed = True
+            self._pairs = []
+            self._size = self._end
+            self.close()
+            raise
+
+    send = feed
+
+    def close(self):
+        """
+        Release the buffer held by this Unpacker, returning it to the buffer
+        pool if there is one.
+        """
+        buffer, self._buffer = self._buffer, None
+        if buffer is not None and self._pool is not None:
+            self._pool.release(buffer)
+
+    def _parse(self):
+        """
+        Unpack as much of the buffered data as possible.
+        """
+        buffer = self._buffer or b""
+        result = self._result
 
         while self._pairs:
-            struct, count, has_string = self._pairs[0]
+            struct, count, has_string, limit = self._pairs[0]
 
             if struct:
                 needed = struct.size
-                if needed > len(self._data):
-                    return self._remaining - len(self._data)
+                if self._start + needed > self._end:
+                    return
 
-                self._result.extend(struct.unpack(self._data[:needed]))
-                self._data = self._data[needed:]
-                self._remaining -= needed
+                result.extend(struct.unpack_from(buffer, self._start))
+                self._start += needed
 
                 if has_string:
-                    self._pairs[0] = None, count, has_string
-                    self._remaining += self._result[-1]
+                    self._pairs[0] = None, count, has_string, limit
+                    self._size += result[-1]
+                    _check_length(result[-1], limit, self._size, self._maxsize)
+
+                    if self._pool is not None and \
+                            self._size > self._pool.capacity:
+                        raise error("unpack requires a buffer of %d bytes" %
+                                    self._size)
 
             if has_string:
-                needed = self._result[-1]
-                if needed > len(self._data):
-                    return self._remaining - len(self._data)
+                needed = result[-1]
+                if self._start + needed > self._end:
+                    return
 
-                self._result.pop()
-                self._result.append(self._data[:needed])
-                self._data = self._data[needed:]
-                self._remaining -= needed
+                result[-1] = bytes(buffer[self._start:self._start + needed])
+                self._start += needed
 
             self._pairs.pop(0)
 
-        return 0
+
+###############################################################################
+# BufferPool Class
+###############################################################################
+
+class BufferPool(object):
+    """
+    A pool of :class:`bytearray` buffers, each *capacity* bytes long, that
+    may be shared between many :class:`Unpacker` instances to avoid
+    allocating a new buffer for every message. At most *count* idle buffers
+    are kept by the pool.
+
+    .. code-block:: python
+
+        >>> pool = netstruct.BufferPool(4096)
+        >>> obj = netstruct.obj_unpack(b"h$", pool=pool)
+
+    Messages larger than *capacity* can't be unpacked using the pool.
+    """
+
+    __slots__ = ("_capacity", "_count", "_free")
+
+    def __init__(self, capacity, count=16):
+        self._capacity = capacity
+        self._count = count
+        self._free = []
+
+    def __repr__(self):
+        return "<%s[capacity=%r, available=%r] at 0x%08X>" % (
+            self.__class__.__name__,
+            self._capacity,
+            len(self._free),
+            id(self)
+        )
+
+    @property
+    def capacity(self):
+        """ The size of each buffer in the pool. """
+        return self._capacity
+
+    @property
+    def available(self):
+        """ The number of idle buffers currently held by the pool. """
+        return len(self._free)
+
+    ##### Methods #############################################################
+
+    def acquire(self):
+        """
+        Return an idle buffer from the pool, or a new one if there are none.
+        """
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray(self._capacity)
+
+    def release(self, buffer):
+        """
+        Return *buffer* to the pool so that it may be used again.
+        """
+        if len(buffer) != self._capacity:
+            raise ValueError("buffer does not belong to this pool")
+
+        if len(self._free) < self._count:
+            self._free.append(buffer)
+
+
+###############################################################################
+# Decoder and Encoder Classes
+###############################################################################
+
+class Decoder(object):
+    """
+    Decode a compressed stream of messages packed with the NetStruct
+    *netstruct*. *compression* may be ``"zlib"``, ``"bz2"``, ``"lzma"``, or a
+    decompressor object with the same interface, such as the one returned by
+    :func:`zlib.decompressobj`.
+
+    Data is never decompressed beyond the :attr:`Unpacker.remaining` bytes
+    needed by the current message, so the amount of data held in memory is
+    limited by the message size rather than by the compressed chunk. The
+    *pool* is passed on to each :class:`Unpacker`.
+
+    .. code-block:: python
+
+        >>> ns = netstruct.NetStruct(b"b$")
+        >>> data = netstruct.Encoder(ns).encode([(b"Hello",), (b"World",)])
+        >>> dec = netstruct.Decoder(ns)
+        >>> dec.feed(data)
+        [[b'Hello'], [b'World']]
+
+    The decompressors for ``"bz2"`` and ``"lzma"`` can only limit their
+    output on Python 3.5 and later. On earlier versions, and for any other
+    decompressor that can't limit its output, a :class:`ValueError` is raised.
+
+    Any data received after the end of the compressed stream is added to
+    :attr:`unused_data`. If the stream ends in the middle of a message, or a
+    message can't be unpacked, a :class:`struct.error` is raised and every
+    later call to :meth:`feed` raises as well.
+    """
+
+    __slots__ = ("_netstruct", "_pool", "_decompressor", "_unpacker",
+                 "_unused", "_failed")
+
+    def __init__(self, netstruct, compression="zlib", pool=None):
+        if not netstruct._minsize:
+            raise error("cannot decode a stream of empty messages")
+
+        if isinstance(compression, (bytes, type(""))):
+            compression = _codec(compression)
+            if compression is zlib:
+                compression = zlib.decompressobj()
+            elif compression is bz2:
+                compression = bz2.BZ2Decompressor()
+            else:
+                compression = lzma.LZMADecompressor()
+
+        if not hasattr(compression, "unconsumed_tail") and \
+                not hasattr(compression, "needs_input"):
+            raise ValueError("decompressor can't limit its output size")
+
+        self._netstruct = netstruct
+        self._pool = pool
+        self._decompressor = compression
+        self._unpacker = None
+        self._unused = b""
+        self._failed = False
+
+    def __repr__(self):
+        return "<%s[%r] at 0x%08X>" % (
+            self.__class__.__name__,
+            self._netstruct,
+            id(self)
+        )
+
+    @property
+    def remaining(self):
+        """
+        The number of decompressed bytes needed to finish the current message.
+        """
+        if self._unpacker is None:
+            return self._netstruct._minsize
+        return self._unpacker.remaining
+
+    @property
+    def eof(self):
+        """
+        True if the end of the compressed stream has been reached. Before
+        Python 3.3, the end of a zlib stream is only noticed once data after
+        it has been received.
+        """
+        decompressor = self._decompressor
+        if hasattr(decompressor, "eof"):
+            return decompressor.eof
+        return bool(decompressor.unused_data)
+
+    @property
+    def unused_data(self):
+        """
+        A string which contains any bytes found after the end of the
+        compressed stream.
+        """
+        return self._decompressor.unused_data + self._unused
+
+    ##### Methods #############################################################
+
+    def feed(self, data):
+        """
+        Decompress *data* and return a list of the messages it completed.
+        """
+        if self._failed:
+            raise error("decoder has already failed")
+        elif self.eof:
+            self._unused += data
+            return []
+
+        decompressor = self._decompressor
+        tail = hasattr(decompressor, "unconsumed_tail")
+        messages = []
+
+        try:
+            while not self.eof:
+                if self._unpacker is None:
+                    self._unpacker = Unpacker(self._netstruct, pool=self._pool)
+
+                limit = min(self._unpacker.remaining, sys.maxsize)
+                chunk = decompressor.decompress(data, limit)
+                data = decompressor.unconsumed_tail if tail else b""
+
+                if chunk:
+                    if not self._unpacker.feed(chunk):
+                        messages.append(self._unpacker.result)
+                        self._unpacker = None
+                elif tail and not data:
+                    break
+                elif not tail and decompressor.needs_input:
+                    break
+
+            if self.eof and self._unpacker is not None:
+                if self._unpacker._end:
+                    raise error("compressed stream ended in the middle of "
+                                "a message")
+                self.close()
+        except error:
+            self._failed = True
+            self.close()
+            raise
+
+        return messages
 
     send = feed
 
+    def close(self):
+        """
+        Release the buffer held by the current :class:`Unpacker`, if any.
+        """
+        if self._unpacker is not None:
+            self._unpacker.close()
+            self._unpacker = None
+
+
+class Encoder(object):
+    """
+    Pack messages with the NetStruct *netstruct* and compress them into a
+    single stream. *compression* may be ``"zlib"``, ``"bz2"``, ``"lzma"``, or
+    a compressor object with the same interface, such as the one returned by
+    :func:`zlib.compressobj`.
+
+    Each call to :meth:`encode` returns the compressed data for a batch of
+    messages. With zlib, the batch is flushed so that it may be decoded
+    right away. Other compressors may hold data back until :meth:`flush` is
+    called to end the stream.
+    """
+
+    __slots__ = ("_netstruct", "_compressor", "_sync")
+
+    def __init__(self, netstruct, compression="zlib"):
+        if isinstance(compression, (bytes, type(""))):
+            compression = _codec(compression)
+            if compression is zlib:
+                compression = zlib.compressobj()
+            elif compression is bz2:
+                compression = bz2.BZ2Compressor()
+            else:
+                compression = lzma.LZMACompressor()
+
+        self._netstruct = netstruct
+        self._compressor = compression
+        self._sync = isinstance(compression, _ZlibCompress)
+
+    def __repr__(self):
+        return "<%s[%r] at 0x%08X>" % (
+            self.__class__.__name__,
+            self._netstruct,
+            id(self)
+        )
+
+    ##### Methods #############################################################
+
+    def encode(self, messages):
+        """
+        Pack and compress each sequence of values in *messages*, returning
+        the compressed data.
+        """
+        pack = self._netstruct.pack
+        compress = self._compressor.compress
+
+        result = [compress(pack(*message)) for message in messages]
+        if self._sync:
+            result.append(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+
+        return b"".join(result)
+
+    def flush(self):
+        """
+        Finish the compressed stream and return any remaining data.
+        """
+        return self._compressor.flush()
+
 
 ###############################################################################
 # NetStruct Class
@@ -200,16 +572,33 @@ class NetStruct(object):
 
         >>> netstruct.pack(b"b$", b"Hello World!")
         b'\x0cHello World!'
+
+    Since a length prefix can announce any size, you may limit the amount of
+    data the NetStruct will accept when unpacking. *max_size* is the largest
+    allowed size of a complete message, and *max_lengths*, if given, is a
+    sequence with one maximum length (or None) for each ``$`` in the format.
+    A :class:`struct.error` is raised as soon as a string length is unpacked
+    that exceeds either limit::
+
+        >>> ns = netstruct.NetStruct(b"b$", max_lengths=[8])
+        >>> ns.unpack(b"\x0cHello World!")
+        Traceback (most recent call last):
+          ...
+        struct.error: string length 12 exceeds maximum of 8
     """
 
-    __slots__ = ("_format", "_pairs", "_minsize", "_initsize", "_count")
+    __slots__ = ("_format", "_pairs", "_minsize", "_initsize", "_count",
+                 "_maxsize")
 
-    def __init__(self, format):
+    def __init__(self, format, max_size=None, max_lengths=None):
         self._format = format
         self._minsize = 0
         self._count = 0
+        self._maxsize = max_size
 
         if not format:
+            if max_lengths:
+                raise error("max_lengths requires exactly 0 values")
             self._pairs = []
             self._initsize = 0
         elif not isinstance(format, bytes):
@@ -219,6 +608,13 @@ class NetStruct(object):
             if b"$$" in format:
                 raise error("invalid sequence in netstruct format")
 
+            strings = format.count(b"$")
+            if max_lengths is None:
+                max_lengths = (None,) * strings
+            elif len(max_lengths) != strings:
+                raise error("max_lengths requires exactly %d values" % strings)
+            limits = iter(max_lengths)
+
             # Break the format down.
             self._pairs = pairs = []
 
@@ -238,10 +634,14 @@ class NetStruct(object):
                 self._minsize += st.size
                 count = _count(segment)
                 self._count += count
-                pairs.append((st, count, sep))
+                pairs.append((st, count, sep, next(limits) if sep else None))
 
             self._initsize = pairs[0][0].size
 
+        if max_size is not None and max_size < self._minsize:
+            raise error("max_size is less than the minimum size of %d" %
+                        self._minsize)
+
     def __repr__(self):
         return "%s(%r)" % (self.__class__.__name__, self._format)
 
@@ -267,6 +667,18 @@ class NetStruct(object):
         """
         return self._initsize
 
+    @property
+    def max_size(self):
+        """ The maximum allowed size of this NetStruct, or None. """
+        return self._maxsize
+
+    @property
+    def max_lengths(self):
+        """
+        A tuple of the maximum allowed lengths of each variable-length string.
+        """
+        return tuple(limit for _, _, sep, limit in self._pairs if sep)
+
     ##### Methods #############################################################
 
     def pack(self, *data):
@@ -280,7 +692,7 @@ class NetStruct(object):
         if len(data) != self._count:
             raise error("pack requires exactly %d arguments", self._count)
 
-        for struct, count, has_string in self._pairs:
+        for struct, count, has_string, limit in self._pairs:
             if has_string:
                 append(struct.pack(*data[:count-1] +
                                            (len(data[count-1]),)))
@@ -301,14 +713,15 @@ class NetStruct(object):
             raise error("unpack requires a string argument of length %d" % (len(data) + out))
         return out
 
-    def obj_unpack(self, data=b""):
+    def obj_unpack(self, data=b"", pool=None):
         """
         Use an :class:`Unpacker` instance to unpack a string of data
-        using this NetStruct's format.
+        using this NetStruct's format, optionally borrowing its buffer from
+        the :class:`BufferPool` *pool*.
 
         See :class:`Unpacker` for more details.
         """
-        return Unpacker(self, data)
+        return Unpacker(self, data, pool)
 
     def iter_unpack(self, data=b""):
         """
@@ -344,8 +757,9 @@ class NetStruct(object):
         """
         result = []
         remaining = self._minsize
+        size = self._minsize
 
-        for struct, count, has_string in self._pairs:
+        for struct, count, has_string, limit in self._pairs:
 
             needed = struct.size
             while needed > len(data):
@@ -359,6 +773,9 @@ class NetStruct(object):
 
             if has_string:
                 needed = result.pop()
+                size += needed
+                _check_length(needed, limit, size, self._maxsize)
+
                 while needed > len(data):
                     new_data = yield (remaining + needed) - len(data)
                     if new_data:
@@ -374,6 +791,30 @@ class NetStruct(object):
 # Private Methods
 ###############################################################################
 
+def _check_length(length, limit, size, max_size):
+    """
+    Make sure an unpacked string length, and the resulting size of the
+    message, are within the given limits.
+    """
+    if length < 0:
+        raise error("string length %d is negative" % length)
+    elif limit is not None and length > limit:
+        raise error("string length %d exceeds maximum of %d" % (length, limit))
+    elif max_size is not None and size > max_size:
+        raise error("message size %d exceeds maximum of %d" % (size, max_size))
+
+def _codec(name):
+    """
+    Return the compression module with the given name.
+    """
+    if isinstance(name, bytes):
+        name = name.decode("ascii")
+
+    codec = {"zlib": zlib, "bz2": bz2, "lzma": lzma}.get(name)
+    if codec is None:
+        raise ValueError("unsupported compression %r" % name)
+    return codec
+
 def _count(format):
     """
     Count the number of variables needed to pack a given format.
@@ -429,12 +870,12 @@ def iter_unpack(format, initial=b""):
     """
     return NetStruct(format).iter_unpack(initial)
 
-def obj_unpack(format, initial=b""):
+def obj_unpack(format, initial=b"", pool=None):
     """
     Use an :class:`Unpacker` to unpack a string of data that has been packed
     according to the given format. See :class:`Unpacker` for more details.
     """
-    return NetStruct(format).obj_unpack(initial)
+    return NetStruct(format).obj_unpack(initial, pool)
 
 def minimum_size(format):
     """
@@ -24,6 +24,17 @@ from __future__ import unicode_literals
 
 import netstruct
 import unittest
+import zlib
+
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 ###############################################################################
 # Tests
@@ -182,6 +193,242 @@ class TestObjUnpack(unittest.TestCase):
         self.assertEqual(obj.result, [131076, b"", 5, 4, 3, 2, 1])
 
 
+class TestLimits(unittest.TestCase):
+    def test_max_lengths_count(self):
+        with self.assertRaises(netstruct.error):
+            netstruct.NetStruct(b"b$b$", max_lengths=[4])
+
+    def test_max_size_too_small(self):
+        with self.assertRaises(netstruct.error):
+            netstruct.NetStruct(b"ib$", max_size=4)
+
+    def test_properties(self):
+        ns = netstruct.NetStruct(b"b$h$i", max_size=64, max_lengths=[8, None])
+        self.assertEqual(ns.max_size, 64)
+        self.assertEqual(ns.max_lengths, (8, None))
+
+    def test_unpack_length(self):
+        ns = netstruct.NetStruct(b"b$", max_lengths=[8])
+        self.assertEqual(ns.unpack(b"\x05Hello"), [b"Hello"])
+        with self.assertRaises(netstruct.error):
+            ns.unpack(b"\x0cHello World!")
+
+    def test_iter_unpack_size(self):
+        it = netstruct.NetStruct(b"Q$", max_size=1024).iter_unpack()
+        next(it)
+        with self.assertRaises(netstruct.error):
+            it.send(b"\x00\x00\x00\x01\x00\x00\x00\x00")
+
+    def test_obj_unpack_size(self):
+        obj = netstruct.NetStruct(b"Q$", max_size=1024).obj_unpack()
+        with self.assertRaises(netstruct.error):
+            obj.feed(b"\x00\x00\x00\x01\x00\x00\x00\x00")
+
+    def test_negative_length(self):
+        with self.assertRaises(netstruct.error):
+            netstruct.obj_unpack(b"b$", b"\xffabc")
+
+    def test_remaining(self):
+        obj = netstruct.NetStruct(b"h$", max_lengths=[16]).obj_unpack()
+        self.assertEqual(obj.feed(b"\x00\x10"), 16)
+        self.assertEqual(obj.remaining, 16)
+
+    def test_failed(self):
+        obj = netstruct.NetStruct(b"H$", max_lengths=[8]).obj_unpack()
+        with self.assertRaises(netstruct.error):
+            obj.feed(b"\x00\x64")
+        with self.assertRaises(netstruct.error):
+            obj.feed(b"x" * 100)
+        self.assertEqual(obj.remaining, 0)
+        self.assertEqual(obj.result, None)
+        self.assertEqual(obj.unused_data, b"")
+
+
+class TestBufferPool(unittest.TestCase):
+    def test_reuse(self):
+        pool = netstruct.BufferPool(32)
+        ns = netstruct.NetStruct(b"b$b")
+
+        obj = ns.obj_unpack(b"\x05Hel", pool=pool)
+        self.assertEqual(pool.available, 0)
+        self.assertEqual(obj.feed(b"lo\x07 more"), 0)
+        self.assertEqual(obj.result, [b"Hello", 7])
+        self.assertEqual(obj.unused_data, b" more")
+        self.assertEqual(pool.available, 1)
+
+        buffer = pool.acquire()
+        pool.release(buffer)
+        obj = ns.obj_unpack(b"\x02Hi", pool=pool)
+        self.assertEqual(pool.available, 0)
+        self.assertEqual(obj.feed(b"\x01"), 0)
+        self.assertEqual(obj.result, [b"Hi", 1])
+        self.assertIs(pool.acquire(), buffer)
+
+    def test_too_large(self):
+        pool = netstruct.BufferPool(8)
+        obj = netstruct.obj_unpack(b"b$", pool=pool)
+        with self.assertRaises(netstruct.error):
+            obj.feed(b"\x0cHello World!")
+        self.assertEqual(pool.available, 1)
+
+        with self.assertRaises(netstruct.error):
+            obj.feed(b"Hello World!")
+        self.assertEqual(pool.available, 1)
+
+    def test_minimum_size(self):
+        with self.assertRaises(netstruct.error):
+            netstruct.obj_unpack(b"4q", pool=netstruct.BufferPool(8))
+
+    def test_empty_feed(self):
+        pool = netstruct.BufferPool(8)
+        pool.release(pool.acquire())
+        obj = netstruct.obj_unpack(b"i", pool=pool)
+        self.assertEqual(obj.feed(b""), 4)
+        self.assertEqual(pool.available, 1)
+        self.assertEqual(obj.feed(b"\x00\x00\x00\x01"), 0)
+        self.assertEqual(obj.result, [1])
+
+    def test_close(self):
+        pool = netstruct.BufferPool(8)
+        obj = netstruct.obj_unpack(b"i", b"\x00", pool=pool)
+        obj.close()
+        self.assertEqual(pool.available, 1)
+
+    def test_foreign_buffer(self):
+        with self.assertRaises(ValueError):
+            netstruct.BufferPool(8).release(bytearray(4))
+
+
+class TestDecoder(unittest.TestCase):
+    def test_messages(self):
+        ns = netstruct.NetStruct(b"b$h")
+        data = zlib.compress(b"\x05Hello\x00\x01\x05World\x00\x02")
+        self.assertEqual(
+            netstruct.Decoder(ns).feed(data),
+            [[b"Hello", 1], [b"World", 2]]
+        )
+
+    def test_partial(self):
+        ns = netstruct.NetStruct(b"b$h")
+        data = zlib.compress(b"\x05Hello\x00\x01")
+        dec = netstruct.Decoder(ns)
+
+        self.assertEqual(dec.feed(data[:-6]), [])
+        self.assertEqual(dec.feed(data[-6:]), [[b"Hello", 1]])
+        self.assertTrue(dec.eof)
+
+    def test_remaining(self):
+        ns = netstruct.NetStruct(b"h$")
+        dec = netstruct.Decoder(ns)
+        comp = zlib.compressobj()
+        dec.feed(comp.compress(b"\x00\x10" + b"x" * 4) +
+                 comp.flush(zlib.Z_SYNC_FLUSH))
+        self.assertEqual(dec.remaining, 12)
+
+    def test_max_size(self):
+        ns = netstruct.NetStruct(b"I$", max_size=64)
+        data = zlib.compress(b"\x00\x10\x00\x00" + b"\x00" * 0x100000)
+        with self.assertRaises(netstruct.error):
+            netstruct.Decoder(ns).feed(data)
+
+    def test_unused_data(self):
+        dec = netstruct.Decoder(netstruct.NetStruct(b"b"))
+        self.assertEqual(dec.feed(zlib.compress(b"\x01") + b"extra"), [[1]])
+        self.assertEqual(dec.unused_data, b"extra")
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            netstruct.Decoder(netstruct.NetStruct(b"b"), "rar")
+
+    def test_unlimited(self):
+        with self.assertRaises(ValueError):
+            netstruct.Decoder(netstruct.NetStruct(b"b"), object())
+
+    def test_after_eof(self):
+        dec = netstruct.Decoder(netstruct.NetStruct(b"b"))
+        self.assertEqual(dec.feed(zlib.compress(b"\x01")), [[1]])
+        self.assertEqual(dec.feed(b"more"), [])
+        self.assertEqual(dec.unused_data, b"more")
+
+    def test_truncated(self):
+        dec = netstruct.Decoder(netstruct.NetStruct(b"b$"))
+        with self.assertRaises(netstruct.error):
+            dec.feed(zlib.compress(b"\x05Hel"))
+
+    def test_failed(self):
+        ns = netstruct.NetStruct(b"H$", max_lengths=[8])
+        data = zlib.compress(b"\x00\x64" + b"x" * 100)
+        dec = netstruct.Decoder(ns)
+
+        with self.assertRaises(netstruct.error):
+            dec.feed(data[:-4])
+        with self.assertRaises(netstruct.error):
+            dec.feed(data[-4:])
+
+    def test_empty(self):
+        with self.assertRaises(netstruct.error):
+            netstruct.Decoder(netstruct.NetStruct(b""))
+
+    def test_huge_length(self):
+        dec = netstruct.Decoder(netstruct.NetStruct(b"Q$"))
+        with self.assertRaises(netstruct.error):
+            dec.feed(zlib.compress(b"\xff" * 8 + b"abc"))
+        with self.assertRaises(netstruct.error):
+            dec.feed(b"more")
+
+
+class TestEncoder(unittest.TestCase):
+    def test_batches(self):
+        ns = netstruct.NetStruct(b"b$h")
+        enc = netstruct.Encoder(ns)
+        dec = netstruct.Decoder(ns)
+
+        self.assertEqual(
+            dec.feed(enc.encode([(b"Hello", 1), (b"World", 2)])),
+            [[b"Hello", 1], [b"World", 2]]
+        )
+        self.assertEqual(dec.feed(enc.encode([(b"Again", 3)])), [[b"Again", 3]])
+        self.assertEqual(dec.feed(enc.flush()), [])
+        self.assertTrue(dec.eof)
+
+    def test_compressor(self):
+        ns = netstruct.NetStruct(b"b$")
+        enc = netstruct.Encoder(ns, zlib.compressobj(9))
+        data = enc.encode([(b"Hello",)]) + enc.flush()
+        self.assertEqual(zlib.decompress(data), b"\x05Hello")
+
+    def round_trip(self, compression):
+        ns = netstruct.NetStruct(b"h$i")
+        messages = [[b"x" * (i * 37 % 500), i] for i in range(50)]
+        enc = netstruct.Encoder(ns, compression)
+        data = enc.encode(messages[:25]) + enc.encode(messages[25:])
+        data += enc.flush()
+
+        for size in (1, 7, 64):
+            dec = netstruct.Decoder(ns, compression)
+            result = []
+            for i in range(0, len(data), size):
+                result.extend(dec.feed(data[i:i + size]))
+
+            self.assertEqual(result, messages)
+            self.assertTrue(dec.eof)
+
+    def test_zlib(self):
+        self.round_trip("zlib")
+
+    @unittest.skipIf(bz2 is None or
+                     not hasattr(bz2.BZ2Decompressor(), "needs_input"),
+                     "bz2 can't limit its output")
+    def test_bz2(self):
+        self.round_trip("bz2")
+
+    @unittest.skipIf(lzma is None or
+                     not hasattr(lzma.LZMADecompressor(), "needs_input"),
+                     "lzma can't limit its output")
+    def test_lzma(self):
+        self.round_trip("lzma")
+
+
 ###############################################################################
 # Execution
 ###############################################################################